@@ -1,11 +1,14 @@
 use asm_lsp::*;
 
+use anyhow::anyhow;
 use log::{error, info};
+use lsp_types::notification::{DidChangeTextDocument, DidCloseTextDocument, DidOpenTextDocument};
 use lsp_types::request::HoverRequest;
 use lsp_types::*;
 
-use lsp_server::{Connection, Message, Request, RequestId, Response};
-use serde_json::json;
+use lsp_server::{Connection, ErrorCode, Message, Notification, Request, RequestId, Response};
+use std::collections::HashMap;
+use std::thread;
 
 // main -------------------------------------------------------------------------------------------
 pub fn main() -> anyhow::Result<()> {
@@ -14,34 +17,23 @@ pub fn main() -> anyhow::Result<()> {
     // logging only write out to stderr.
     flexi_logger::Logger::with_str("info").start()?;
 
-    // create a map of &Instruction_name -> &Instruction - Use that in user queries
-    // The Instruction(s) themselves are stored in a vector and we only keep references to the
-    // former map
+    // Both instruction sets share the same online documentation - fetch it only once. Fetching,
+    // parsing the two instruction sets and initialising the lsp server are independent of each
+    // other, run them in parallel
+    info!("Fetching online documentation -> x86, x86_64...");
+    let x86_docs_handle = thread::spawn(get_x86_docs_urls);
+
     info!("Populating instruction set -> x86...");
-    let xml_conts_x86 = include_str!("../../opcodes/x86.xml");
-    let x86_instructions =
-        populate_instructions(&xml_conts_x86)?
-            .into_iter()
-            .map(|mut instruction| {
-                instruction.arch = Some(Arch::X86);
-                instruction
-            }).collect();
+    let x86_handle = thread::spawn(|| {
+        let xml_conts_x86 = include_str!("../../opcodes/x86.xml");
+        populate_arch_instructions(&xml_conts_x86, Arch::X86)
+    });
 
     info!("Populating instruction set -> x86_64...");
-    let xml_conts_x86_64 = include_str!("../../opcodes/x86_64.xml");
-    let x86_64_instructions =
-        populate_instructions(&xml_conts_x86_64)?
-            .into_iter()
-            .map(|mut instruction| {
-                instruction.arch = Some(Arch::X86_64);
-                instruction
-            }).collect();
-
-    // TODO - Currently in case a name exists both in x86 and x86_64 the latter overrides the
-    // former. Modify this to allow to return both
-    let mut names_to_instructions = NameToInstructionMap::new();
-    populate_name_to_instruction_map(&x86_instructions, &mut names_to_instructions);
-    populate_name_to_instruction_map(&x86_64_instructions, &mut names_to_instructions);
+    let x86_64_handle = thread::spawn(|| {
+        let xml_conts_x86_64 = include_str!("../../opcodes/x86_64.xml");
+        populate_arch_instructions(&xml_conts_x86_64, Arch::X86_64)
+    });
 
     // LSP server initialisation ------------------------------------------------------------------
     info!("Starting lsp server...");
@@ -51,12 +43,52 @@ pub fn main() -> anyhow::Result<()> {
 
     // Run the server and wait for the two threads to end (typically by trigger LSP Exit event).
     let hover_provider = Some(HoverProviderCapability::Simple(true));
+    // keep the contents of open documents in memory instead of reading them from disk on every
+    // request. Clients only send the edited ranges rather than the whole document on every change
+    let text_document_sync = Some(TextDocumentSyncCapability::Kind(
+        TextDocumentSyncKind::Incremental,
+    ));
     let capabilities = ServerCapabilities {
         hover_provider,
+        text_document_sync,
         ..ServerCapabilities::default()
     };
     let server_capabilities = serde_json::to_value(&capabilities).unwrap();
     let initialization_params = connection.initialize(server_capabilities)?;
+
+    // The initialisation handshake doesn't need the instruction sets - only wait for them to be
+    // parsed once we are about to serve requests
+    let mut x86_instructions = x86_handle
+        .join()
+        .map_err(|_| anyhow!("Failed to populate instruction set -> x86"))??;
+    let mut x86_64_instructions = x86_64_handle
+        .join()
+        .map_err(|_| anyhow!("Failed to populate instruction set -> x86_64"))??;
+    // the online documentation is only an extra link in the hover text - the client has already
+    // been initialised, so keep serving requests without it instead of exiting
+    let x86_docs_urls = match x86_docs_handle.join() {
+        Ok(Ok(x86_docs_urls)) => x86_docs_urls,
+        Ok(Err(e)) => {
+            error!("Failed to fetch online documentation -> {}", e);
+            NameToUrlMap::new()
+        }
+        Err(_) => {
+            error!("Failed to fetch online documentation -> x86, x86_64");
+            NameToUrlMap::new()
+        }
+    };
+    populate_instruction_urls(&mut x86_instructions, &x86_docs_urls);
+    populate_instruction_urls(&mut x86_64_instructions, &x86_docs_urls);
+
+    // create a map of &Instruction_name -> &Instruction - Use that in user queries
+    // The Instruction(s) themselves are stored in a vector and we only keep references to the
+    // former map
+    // TODO - Currently in case a name exists both in x86 and x86_64 the latter overrides the
+    // former. Modify this to allow to return both
+    let mut names_to_instructions = NameToInstructionMap::new();
+    populate_name_to_instruction_map(&x86_instructions, &mut names_to_instructions);
+    populate_name_to_instruction_map(&x86_64_instructions, &mut names_to_instructions);
+
     main_loop(&connection, initialization_params, &names_to_instructions)?;
     io_threads.join()?;
 
@@ -65,12 +97,25 @@ pub fn main() -> anyhow::Result<()> {
     Ok(())
 }
 
+/// Parse the instructions of the given XML contents and tag each of them with `arch`
+fn populate_arch_instructions(xml_contents: &str, arch: Arch) -> anyhow::Result<Vec<Instruction>> {
+    let mut instructions = populate_instructions(xml_contents)?;
+    for instruction in &mut instructions {
+        instruction.arch = Some(arch);
+    }
+
+    Ok(instructions)
+}
+
 fn main_loop(
     connection: &Connection,
     params: serde_json::Value,
     names_to_instructions: &NameToInstructionMap,
 ) -> anyhow::Result<()> {
     let _params: InitializeParams = serde_json::from_value(params).unwrap();
+    let mut text_documents = TextDocuments::new();
+    // instructions are immutable once parsed - render the documentation of each one only once
+    let mut hover_cache = HashMap::<&str, String>::new();
     info!("Starting LSP loop...");
     for msg in &connection.receiver {
         match msg {
@@ -81,63 +126,91 @@ fn main_loop(
                 match cast::<HoverRequest>(req) {
                     // HoverRequest ---------------------------------------------------------------
                     Ok((id, params)) => {
-                        let res = Response {
-                            id: id.clone(),
-                            result: Some(json!("")),
+                        // Hover on a word that isn't a known instruction -> null result
+                        let hover_res = get_hover_resp(
+                            &params,
+                            &text_documents,
+                            names_to_instructions,
+                            &mut hover_cache,
+                        );
+                        let result = serde_json::to_value(&hover_res).unwrap();
+                        let result = Response {
+                            id,
+                            result: Some(result),
                             error: None,
                         };
-
-                        // get the word under the cursor
-                        let word = get_word_from_file_params(&params.text_document_position_params);
-
-                        // get documentation ------------------------------------------------------
-                        // format response
-                        let hover_res: Hover;
-                        match word {
-                            Ok(word) => {
-                                match names_to_instructions.get(&*word) {
-                                    Some(instruction) => {
-                                        // word is a known instruction
-                                        hover_res = Hover {
-                                            contents: HoverContents::Markup(MarkupContent {
-                                                kind: MarkupKind::Markdown,
-                                                value: format!("{}", instruction),
-                                            }),
-                                            range: None,
-                                        };
-                                        let result = Some(hover_res);
-                                        let result = serde_json::to_value(&result).unwrap();
-                                        let result = Response {
-                                            id: id.clone(),
-                                            result: Some(result),
-                                            error: None,
-                                        };
-                                        connection.sender.send(Message::Response(result))?;
-                                    }
-                                    _ => {
-                                        // don't know of this word
-                                        connection.sender.send(Message::Response(res.clone()))?;
-                                    }
-                                }
-                            }
-                            Err(_) => {
-                                // given word is not valid
-                                connection.sender.send(Message::Response(res))?;
-                            }
-                        }
+                        connection.sender.send(Message::Response(result))?;
                     }
                     Err(req) => {
+                        // unsupported request - reply straight away so that the client doesn't
+                        // keep waiting for a response
                         error!("Invalid request format -> {:#?}", req);
+                        let res = Response::new_err(
+                            req.id,
+                            ErrorCode::MethodNotFound as i32,
+                            format!("Unsupported request -> {}", req.method),
+                        );
+                        connection.sender.send(Message::Response(res))?;
                     }
                 };
             }
             Message::Response(_resp) => {}
-            Message::Notification(_notification) => {}
+            Message::Notification(notification) => {
+                let notification = match cast_notification::<DidOpenTextDocument>(notification) {
+                    Ok(params) => {
+                        let text_document = params.text_document;
+                        text_documents.insert(text_document.uri, text_document.text);
+                        continue;
+                    }
+                    Err(notification) => notification,
+                };
+                let notification = match cast_notification::<DidChangeTextDocument>(notification) {
+                    Ok(params) => {
+                        if let Some(text) = text_documents.get_mut(&params.text_document.uri) {
+                            for change in params.content_changes {
+                                apply_text_document_change(text, change);
+                            }
+                        }
+                        continue;
+                    }
+                    Err(notification) => notification,
+                };
+                if let Ok(params) = cast_notification::<DidCloseTextDocument>(notification) {
+                    text_documents.remove(&params.text_document.uri);
+                }
+            }
         }
     }
     Ok(())
 }
 
+/// Build the hover response for the word under the cursor, if that's a known instruction
+fn get_hover_resp<'instruction>(
+    params: &HoverParams,
+    text_documents: &TextDocuments,
+    names_to_instructions: &NameToInstructionMap<'instruction>,
+    hover_cache: &mut HashMap<&'instruction str, String>,
+) -> Option<Hover> {
+    // get the word under the cursor
+    let word =
+        get_word_from_pos_params(text_documents, &params.text_document_position_params).ok()?;
+
+    // get documentation --------------------------------------------------------------------------
+    let (name, instruction) = names_to_instructions.get_key_value(&*word)?;
+    let value = hover_cache
+        .entry(*name)
+        .or_insert_with(|| format!("{}", instruction))
+        .clone();
+
+    Some(Hover {
+        contents: HoverContents::Markup(MarkupContent {
+            kind: MarkupKind::Markdown,
+            value,
+        }),
+        range: None,
+    })
+}
+
 fn cast<R>(req: Request) -> Result<(RequestId, R::Params), Request>
 where
     R: lsp_types::request::Request,
@@ -145,3 +218,11 @@ where
 {
     req.extract(R::METHOD)
 }
+
+fn cast_notification<N>(notification: Notification) -> Result<N::Params, Notification>
+where
+    N: lsp_types::notification::Notification,
+    N::Params: serde::de::DeserializeOwned,
+{
+    notification.extract(N::METHOD)
+}
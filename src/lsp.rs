@@ -1,32 +1,32 @@
-use crate::types::Column;
-use lsp_types::TextDocumentPositionParams;
+use crate::types::{Column, TextDocuments};
+use lsp_types::{Position, TextDocumentContentChangeEvent, TextDocumentPositionParams};
 use std::fs::File;
 use std::io::BufRead;
 
 /// Find the start and end indices of a word inside the given line
 /// Borrowed from RLS
+///
+/// `col` is counted in UTF-16 code units, like the `character` of an LSP position. The returned
+/// indices are byte offsets, so that they can be used directly to slice `line`.
 pub fn find_word_at_pos(line: &str, col: Column) -> (Column, Column) {
-    let line_ = format!("{} ", line);
     let is_ident_char = |c: char| c.is_alphanumeric() || c == '_';
 
-    let start = line_
-        .chars()
-        .enumerate()
-        .take(col)
-        .filter(|&(_, c)| !is_ident_char(c))
-        .last()
-        .map(|(i, _)| i + 1)
-        .unwrap_or(0) as usize;
-
-    #[allow(clippy::filter_next)]
-    let mut end = line_
-        .chars()
-        .enumerate()
-        .skip(col)
-        .filter(|&(_, c)| !is_ident_char(c));
-
-    let end = end.next();
-    (start, end.map(|(i, _)| i).unwrap_or(col) as usize)
+    // byte offset of the cursor - scan outwards from there instead of walking the whole line
+    let col = utf16_col_to_byte_offset(line, col);
+
+    let start = line[..col]
+        .char_indices()
+        .rev()
+        .find(|&(_, c)| !is_ident_char(c))
+        .map(|(i, c)| i + c.len_utf8())
+        .unwrap_or(0);
+
+    let end = line[col..]
+        .find(|c: char| !is_ident_char(c))
+        .map(|i| col + i)
+        .unwrap_or_else(|| line.len());
+
+    (start, end)
 }
 
 pub fn get_word_from_file_params(pos_params: &TextDocumentPositionParams) -> Result<String, ()> {
@@ -34,10 +34,174 @@ pub fn get_word_from_file_params(pos_params: &TextDocumentPositionParams) -> Res
     let line = pos_params.position.line as usize;
     let col = pos_params.position.character as usize;
 
-    let file = File::open(uri.to_file_path()?).expect(&format!("Couldn't open file -> {}", uri));
-    let buf_reader = std::io::BufReader::new(file);
+    let file =
+        File::open(uri.to_file_path()?).unwrap_or_else(|_| panic!("Couldn't open file -> {}", uri));
+    let mut buf_reader = std::io::BufReader::new(file);
+
+    // only the requested line is of interest - read the preceding ones into the same buffer
+    // instead of allocating a new string for each of them
+    let mut line_conts = String::new();
+    for _ in 0..=line {
+        line_conts.clear();
+        if buf_reader.read_line(&mut line_conts).map_err(|_| ())? == 0 {
+            return Err(()); // past the end of the file
+        }
+    }
+    let line_conts = line_conts.trim_end_matches(&['\n', '\r'][..]);
+
+    let (start, end) = find_word_at_pos(line_conts, col);
+    Ok(String::from(&line_conts[start..end]))
+}
+
+/// Same as `get_word_from_file_params` but reads the line from the in-memory contents of the
+/// document when the client has it open, instead of re-reading the file from disk on every
+/// request. Falls back to the file on disk for documents that are not open.
+pub fn get_word_from_pos_params(
+    text_documents: &TextDocuments,
+    pos_params: &TextDocumentPositionParams,
+) -> Result<String, ()> {
+    let text = match text_documents.get(&pos_params.text_document.uri) {
+        Some(text) => text,
+        None => return get_word_from_file_params(pos_params),
+    };
+    let line = pos_params.position.line as usize;
+    let col = pos_params.position.character as usize;
 
-    let line_conts = buf_reader.lines().nth(line).unwrap().unwrap();
-    let (start, end) = find_word_at_pos(&line_conts, col);
+    let line_conts = text.lines().nth(line).ok_or(())?;
+    let (start, end) = find_word_at_pos(line_conts, col);
     Ok(String::from(&line_conts[start..end]))
 }
+
+/// Apply an incremental change sent by the client to the in-memory contents of a document.
+/// Changes that don't specify a range replace the whole document.
+pub fn apply_text_document_change(text: &mut String, change: TextDocumentContentChangeEvent) {
+    match change.range {
+        Some(range) => {
+            let start = position_to_offset(text, &range.start);
+            let end = position_to_offset(text, &range.end).max(start);
+            text.replace_range(start..end, &change.text);
+        }
+        None => *text = change.text,
+    }
+}
+
+/// Convert an LSP position (line and UTF-16 column) to a byte offset inside `text`.
+/// Positions past the end of their line or of the document are clamped to it.
+fn position_to_offset(text: &str, position: &Position) -> usize {
+    let mut line_start = 0;
+    for _ in 0..position.line {
+        match text[line_start..].find('\n') {
+            Some(i) => line_start += i + 1,
+            None => return text.len(),
+        }
+    }
+
+    // the end of the line excludes the line ending, both "\n" and "\r\n"
+    let line = &text[line_start..];
+    let line = &line[..line.find('\n').unwrap_or_else(|| line.len())];
+    let line = line.strip_suffix('\r').unwrap_or(line);
+
+    line_start + utf16_col_to_byte_offset(line, position.character as usize)
+}
+
+/// Convert a column counted in UTF-16 code units (as LSP positions are) to a byte offset inside
+/// `line`. Columns past the end of the line are clamped to it.
+fn utf16_col_to_byte_offset(line: &str, col: usize) -> usize {
+    let mut utf16_col = 0;
+    for (i, c) in line.char_indices() {
+        if utf16_col >= col {
+            return i;
+        }
+        utf16_col += c.len_utf16();
+    }
+
+    line.len()
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use lsp_types::Range;
+
+    fn change(
+        range: Option<((u64, u64), (u64, u64))>,
+        text: &str,
+    ) -> TextDocumentContentChangeEvent {
+        TextDocumentContentChangeEvent {
+            range: range.map(|(start, end)| Range {
+                start: Position::new(start.0, start.1),
+                end: Position::new(end.0, end.1),
+            }),
+            range_length: None,
+            text: String::from(text),
+        }
+    }
+
+    fn apply(text: &str, range: Option<((u64, u64), (u64, u64))>, new_text: &str) -> String {
+        let mut text = String::from(text);
+        apply_text_document_change(&mut text, change(range, new_text));
+        text
+    }
+
+    #[test]
+    fn insert() {
+        assert_eq!(apply("abc\ndef", Some(((1, 1), (1, 1))), "X"), "abc\ndXef");
+        assert_eq!(
+            apply("abc\ndef", Some(((0, 0), (0, 0))), "X\n"),
+            "X\nabc\ndef"
+        );
+    }
+
+    #[test]
+    fn delete_across_lines() {
+        assert_eq!(apply("abc\ndef\nghi", Some(((0, 2), (2, 1))), ""), "abhi");
+    }
+
+    #[test]
+    fn replace_across_lines() {
+        assert_eq!(
+            apply("abc\ndef\nghi", Some(((0, 1), (1, 2))), "XY\nZ"),
+            "aXY\nZf\nghi"
+        );
+    }
+
+    #[test]
+    fn surrogate_pairs() {
+        // "😀" is two UTF-16 code units and four bytes
+        assert_eq!(apply("a😀b", Some(((0, 3), (0, 3))), "X"), "a😀Xb");
+        assert_eq!(apply("a😀b", Some(((0, 1), (0, 3))), ""), "ab");
+        assert_eq!(position_to_offset("x\na😀b", &Position::new(1, 4)), 8);
+    }
+
+    #[test]
+    fn line_past_eof() {
+        assert_eq!(apply("abc\ndef", Some(((5, 0), (5, 0))), "X"), "abc\ndefX");
+        assert_eq!(position_to_offset("abc\n", &Position::new(1, 3)), 4);
+    }
+
+    #[test]
+    fn column_past_eol() {
+        assert_eq!(
+            apply("a😀B\nxy", Some(((0, 99), (0, 99))), "!"),
+            "a😀B!\nxy"
+        );
+        assert_eq!(
+            apply("a😀B\r\nxy", Some(((0, 99), (0, 99))), "!"),
+            "a😀B!\r\nxy"
+        );
+        assert_eq!(apply("ab\r\nxy", Some(((0, 1), (0, 99))), ""), "a\r\nxy");
+    }
+
+    #[test]
+    fn word_after_surrogate_pair() {
+        // the cursor is on "b" - "😀" counts as two columns
+        let line = "a😀 bcd";
+        let (start, end) = find_word_at_pos(line, 4);
+        assert_eq!(&line[start..end], "bcd");
+    }
+
+    #[test]
+    fn no_range_replaces_document() {
+        assert_eq!(apply("abc\ndef", None, "xyz"), "xyz");
+    }
+}
@@ -1,8 +1,9 @@
+use lsp_types::Url;
 use std::collections::HashMap;
 use strum_macros::{AsRefStr, EnumString};
 
 // Instruction ------------------------------------------------------------------------------------
-#[derive(Debug, Clone)]
+#[derive(Default, Debug, Clone)]
 pub struct Instruction {
     pub name: String,
     pub summary: String,
@@ -11,55 +12,26 @@ pub struct Instruction {
     pub arch: Option<Arch>,
 }
 
-impl Default for Instruction {
-    fn default() -> Self {
-        let name = String::new();
-        let summary = String::new();
-        let forms = vec![];
-        let url = None;
-        let arch = None;
-
-        Self {
-            name,
-            summary,
-            forms,
-            url,
-            arch,
-        }
-    }
-}
-
 impl std::fmt::Display for Instruction {
     fn fmt(&self, f: &mut std::fmt::Formatter<'_>) -> std::fmt::Result {
+        // write every piece straight into the formatter instead of collecting and joining them
         // basic fields
-        let header: String;
+        write!(f, "{}", &self.name)?;
         if let Some(arch) = &self.arch {
-            header = format!("{} [{}]", &self.name, arch.as_ref());
-        } else {
-            header = self.name.clone();
+            write!(f, " [{}]", arch.as_ref())?;
         }
-
-        let mut v: Vec<&'_ str> = vec![&header, &self.summary, "\n", "## Forms", "\n"];
+        write!(f, "\n{}\n\n\n## Forms\n\n", &self.summary)?;
 
         // instruction forms
-        let instruction_form_strs: Vec<String> =
-            self.forms.iter().map(|f| format!("{}", f)).collect();
-        for i in 0..instruction_form_strs.len() {
-            v.push(&instruction_form_strs[i]);
+        for form in &self.forms {
+            write!(f, "\n{}", form)?;
         }
 
         // url
-        let more_info: String;
-        match &self.url {
-            None => {}
-            Some(url_) => {
-                more_info = format!("\nMore info: {}", url_);
-                v.push(&more_info);
-            }
+        if let Some(url_) = &self.url {
+            write!(f, "\n\nMore info: {}", url_)?;
         }
 
-        let s = v.join("\n");
-        write!(f, "{}", s)?;
         Ok(())
     }
 }
@@ -103,19 +75,24 @@ pub struct InstructionForm {
 
 impl std::fmt::Display for InstructionForm {
     fn fmt(&self, f: &mut std::fmt::Formatter<'_>) -> std::fmt::Result {
-        let mut s = String::new();
+        // fields are separated by " | " - the first one is prefixed with "- " instead
+        let mut sep = "- ";
         if let Some(val) = &self.gas_name {
-            s += &format!("*GAS*: {} | ", val);
+            write!(f, "{}*GAS*: {}", sep, val)?;
+            sep = " | ";
         }
         if let Some(val) = &self.go_name {
-            s += &format!("*GO*: {} | ", val);
+            write!(f, "{}*GO*: {}", sep, val)?;
+            sep = " | ";
         }
 
         if let Some(val) = &self.mmx_mode {
-            s += &(format!("*MMX*: {} | ", val.as_ref()));
+            write!(f, "{}*MMX*: {}", sep, val.as_ref())?;
+            sep = " | ";
         }
         if let Some(val) = &self.xmm_mode {
-            s += &(format!("*XMM*: {} | ", val.as_ref()));
+            write!(f, "{}*XMM*: {}", sep, val.as_ref())?;
+            sep = " | ";
         }
 
         // cancelling inputs
@@ -124,63 +101,51 @@ impl std::fmt::Display for InstructionForm {
 
         // ISA
         if let Some(val) = &self.isa {
-            s += &format!("*ISA*: {} | ", val.as_ref());
+            write!(f, "{}*ISA*: {}", sep, val.as_ref())?;
+            sep = " | ";
         }
 
-        if !s.is_empty() {
-            s = format!("- {}\n\n", &s[..s.len() - 3]);
+        if sep != "- " {
+            write!(f, "\n\n")?;
         }
 
         // Operands
-        let operands_str: String = self
-            .operands
-            .iter()
-            .map(|op| {
-                let mut s = format!("  + {:<8}", format!("[{}]", op.type_.as_ref()));
-                if let Some(input) = op.input {
-                    s += &format!(" input = {:<5} ", input)
-                }
-                if let Some(output) = op.output {
-                    s += &format!(" output = {:<5}", output)
-                }
-                if let Some(extended_size) = op.extended_size {
-                    s += &format!(" extended-size = {}", extended_size)
-                }
-
-                return s;
-            })
-            .collect::<Vec<String>>()
-            .join("\n");
-        s = s + &operands_str + "\n";
+        for (i, op) in self.operands.iter().enumerate() {
+            if i > 0 {
+                writeln!(f)?;
+            }
+            write!(f, "{}", op)?;
+        }
+        writeln!(f)?;
 
-        write!(f, "{}", s)?;
         Ok(())
     }
 }
 
 // helper structs, types and functions ------------------------------------------------------------
 pub type NameToInstructionMap<'instruction> = HashMap<&'instruction str, &'instruction Instruction>;
+pub type NameToUrlMap = HashMap<String, String>;
 
-#[derive(Debug, Clone, EnumString, AsRefStr)]
+#[derive(Debug, Clone, Copy, EnumString, AsRefStr)]
 pub enum XMMMode {
     SSE,
     AVX,
 }
 
-#[derive(Debug, Clone, EnumString, AsRefStr)]
+#[derive(Debug, Clone, Copy, EnumString, AsRefStr)]
 pub enum MMXMode {
     FPU,
     MMX,
 }
 
-#[derive(Debug, Hash, PartialEq, Eq, Clone, EnumString, AsRefStr)]
+#[derive(Debug, Hash, PartialEq, Eq, Clone, Copy, EnumString, AsRefStr)]
 pub enum Arch {
     X86,
     X86_64,
 }
 
 // Instruction Set Architecture -------------------------------------------------------------------
-#[derive(Debug, Clone, EnumString, AsRefStr)]
+#[derive(Debug, Clone, Copy, EnumString, AsRefStr)]
 pub enum ISA {
     RDTSC,
     RDTSCP,
@@ -245,16 +210,38 @@ pub enum ISA {
 }
 
 // Operand ----------------------------------------------------------------------------------------
-#[derive(Debug, Clone)]
+#[derive(Debug, Clone, Copy)]
 pub struct Operand {
     pub type_: OperandType,
     pub input: Option<bool>,
     pub output: Option<bool>,
-    pub extended_size: Option<usize>,
+    /// Size in bytes the operand is extended to (2, 4 or 8)
+    pub extended_size: Option<u8>,
+}
+
+impl std::fmt::Display for Operand {
+    fn fmt(&self, f: &mut std::fmt::Formatter<'_>) -> std::fmt::Result {
+        // write straight into the formatter - pad "[type]" to 8 characters
+        let type_ = self.type_.as_ref();
+        let padding = 6usize.saturating_sub(type_.len());
+        write!(f, "  + [{}]{:padding$}", type_, "", padding = padding)?;
+
+        if let Some(input) = self.input {
+            write!(f, " input = {:<5} ", input)?;
+        }
+        if let Some(output) = self.output {
+            write!(f, " output = {:<5}", output)?;
+        }
+        if let Some(extended_size) = self.extended_size {
+            write!(f, " extended-size = {}", extended_size)?;
+        }
+
+        Ok(())
+    }
 }
 
 #[allow(non_camel_case_types)]
-#[derive(Debug, Clone, EnumString, AsRefStr)]
+#[derive(Debug, Clone, Copy, EnumString, AsRefStr)]
 pub enum OperandType {
     #[strum(serialize = "1")]
     _1,
@@ -367,3 +354,6 @@ pub enum OperandType {
 
 /// Represents a text cursor between characters, pointing at the next character in the buffer.
 pub type Column = usize;
+
+/// Contents of the text documents that the client currently has open, keyed by their URI
+pub type TextDocuments = HashMap<Url, String>;
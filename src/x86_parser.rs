@@ -6,8 +6,8 @@ use quick_xml::events::attributes::Attribute;
 use quick_xml::events::Event;
 use quick_xml::Reader;
 use regex::Regex;
-use reqwest;
 use std::collections::HashMap;
+use std::mem;
 use std::str;
 use std::str::FromStr;
 
@@ -44,12 +44,12 @@ pub fn populate_instructions(xml_contents: &str) -> anyhow::Result<Vec<Instructi
                         // iterate over the attributes
                         for attr in e.attributes() {
                             let Attribute { key, value } = attr.unwrap();
-                            match str::from_utf8(key).unwrap() {
-                                "name" => unsafe {
+                            match key {
+                                b"name" => unsafe {
                                     curr_instruction.name =
                                         String::from(str::from_utf8_unchecked(&value));
                                 },
-                                "summary" => unsafe {
+                                b"summary" => unsafe {
                                     curr_instruction.summary =
                                         String::from(str::from_utf8_unchecked(&value));
                                 },
@@ -74,58 +74,37 @@ pub fn populate_instructions(xml_contents: &str) -> anyhow::Result<Vec<Instructi
                         // iterate over the attributes
                         for attr in e.attributes() {
                             let Attribute { key, value } = attr.unwrap();
-                            match str::from_utf8(key).unwrap() {
-                                "gas-name" => unsafe {
+                            match key {
+                                b"gas-name" => unsafe {
                                     curr_instruction_form.gas_name =
                                         Some(String::from(str::from_utf8_unchecked(&value)));
                                 },
-                                "go-name" => unsafe {
+                                b"go-name" => unsafe {
                                     curr_instruction_form.go_name =
                                         Some(String::from(str::from_utf8_unchecked(&value)));
                                 },
-                                "mmx-mode" => unsafe {
+                                b"mmx-mode" => unsafe {
                                     let value_ = value.as_ref();
                                     curr_instruction_form.mmx_mode =
                                         Some(MMXMode::from_str(str::from_utf8_unchecked(&value_))?);
                                 },
-                                "xmm-mode" => unsafe {
+                                b"xmm-mode" => unsafe {
                                     let value_ = value.as_ref();
                                     curr_instruction_form.xmm_mode =
                                         Some(XMMMode::from_str(str::from_utf8_unchecked(&value_))?);
                                 },
-                                "cancelling-inputs" => match str::from_utf8(&value).unwrap() {
-                                    "true" => curr_instruction_form.cancelling_inputs = Some(true),
-                                    "false" => {
-                                        curr_instruction_form.cancelling_inputs = Some(false)
-                                    }
-                                    _ => {
-                                        return Err(anyhow!(
-                                            "Unknown value for XML attribute {}",
-                                            "nacl-zero-extends-outputs"
-                                        ))
-                                    }
-                                },
-                                "nacl-version" => {
+                                b"cancelling-inputs" => {
+                                    curr_instruction_form.cancelling_inputs =
+                                        Some(parse_bool_attribute(&value, "cancelling-inputs")?);
+                                }
+                                b"nacl-version" => {
                                     curr_instruction_form.nacl_version =
                                         value.as_ref().first().cloned();
                                 }
-                                "nacl-zero-extends-outputs" => {
-                                    match str::from_utf8(&value).unwrap() {
-                                        "true" => {
-                                            curr_instruction_form.nacl_zero_extends_outputs =
-                                                Some(true)
-                                        }
-                                        "false" => {
-                                            curr_instruction_form.nacl_zero_extends_outputs =
-                                                Some(false)
-                                        }
-                                        _ => {
-                                            return Err(anyhow!(
-                                                "Unknown value for XML attribute {}",
-                                                "nacl-zero-extends-outputs"
-                                            ))
-                                        }
-                                    }
+                                b"nacl-zero-extends-outputs" => {
+                                    curr_instruction_form.nacl_zero_extends_outputs = Some(
+                                        parse_bool_attribute(&value, "nacl-zero-extends-outputs")?,
+                                    );
                                 }
                                 _ => {}
                             }
@@ -140,14 +119,16 @@ pub fn populate_instructions(xml_contents: &str) -> anyhow::Result<Vec<Instructi
                     b"ISA" => {
                         for attr in e.attributes() {
                             let Attribute { key, value } = attr.unwrap();
-                            match str::from_utf8(key).unwrap() {
-                                "id" => unsafe {
+                            match key {
+                                b"id" => unsafe {
                                     curr_instruction_form.isa = Some(
                                         ISA::from_str(str::from_utf8_unchecked(&value.as_ref()))
-                                            .expect(&format!(
-                                                "Unexpected ISA variant - {}",
-                                                str::from_utf8_unchecked(&value)
-                                            )),
+                                            .unwrap_or_else(|_| {
+                                                panic!(
+                                                    "Unexpected ISA variant - {}",
+                                                    str::from_utf8_unchecked(&value)
+                                                )
+                                            }),
                                     )
                                 },
                                 _ => (),
@@ -162,23 +143,19 @@ pub fn populate_instructions(xml_contents: &str) -> anyhow::Result<Vec<Instructi
 
                         for attr in e.attributes() {
                             let Attribute { key, value } = attr.unwrap();
-                            match str::from_utf8(key).unwrap() {
-                                "type" => {
+                            match key {
+                                b"type" => {
                                     type_ = OperandType::from_str(str::from_utf8(&value)?)?;
                                 }
-                                "input" => match str::from_utf8(&value).unwrap() {
-                                    "true" => input = Some(true),
-                                    "false" => input = Some(false),
-                                    _ => return Err(anyhow!("Unknown value for operand type")),
-                                },
-                                "output" => match str::from_utf8(&value).unwrap() {
-                                    "true" => output = Some(true),
-                                    "false" => output = Some(false),
-                                    _ => return Err(anyhow!("Unknown value for operand type")),
-                                },
-                                "extended-size" => {
+                                b"input" => {
+                                    input = Some(parse_bool_attribute(&value, "input")?);
+                                }
+                                b"output" => {
+                                    output = Some(parse_bool_attribute(&value, "output")?);
+                                }
+                                b"extended-size" => {
                                     extended_size = Some(
-                                        str::from_utf8(value.as_ref()).unwrap().parse::<usize>()?,
+                                        str::from_utf8(value.as_ref()).unwrap().parse::<u8>()?,
                                     );
                                 }
                                 _ => (), // unknown event
@@ -199,12 +176,12 @@ pub fn populate_instructions(xml_contents: &str) -> anyhow::Result<Vec<Instructi
             Ok(Event::End(ref e)) => {
                 match e.name() {
                     b"Instruction" => {
-                        // finish instruction
-                        instructions_map
-                            .insert(curr_instruction.name.clone(), curr_instruction.clone());
+                        // finish instruction - move it out instead of cloning all of its forms
+                        let instruction = mem::take(&mut curr_instruction);
+                        instructions_map.insert(instruction.name.clone(), instruction);
                     }
                     b"InstructionForm" => {
-                        curr_instruction.push_form(curr_instruction_form.clone());
+                        curr_instruction.push_form(mem::take(&mut curr_instruction_form));
                     }
                     _ => (), // unknown event
                 }
@@ -213,16 +190,42 @@ pub fn populate_instructions(xml_contents: &str) -> anyhow::Result<Vec<Instructi
             Err(e) => panic!("Error at position {}: {:?}", reader.buffer_position(), e),
             _ => (), // rest of events that we don't consider
         }
+
+        // the contents of the current event are no longer needed - don't let the buffer grow
+        // with the whole document
+        buf.clear();
+    }
+
+    Ok(instructions_map.into_values().collect::<Vec<_>>())
+}
+
+/// Parse the value of an `xs:boolean` XML attribute.
+///
+/// The raw bytes are compared directly, without validating them as UTF-8 first.
+fn parse_bool_attribute(value: &[u8], attribute: &str) -> anyhow::Result<bool> {
+    match value {
+        b"true" => Ok(true),
+        b"false" => Ok(false),
+        _ => Err(anyhow!("Unknown value for XML attribute {}", attribute)),
     }
+}
+
+/// Fetch the index of the online x86 documentation and return a map of instruction name -> URL
+/// of its documentation page.
+///
+/// The same documentation applies to all the x86 instruction sets, so this only has to be done
+/// once and the result can be shared between them - see `populate_instruction_urls`.
+pub fn get_x86_docs_urls() -> anyhow::Result<NameToUrlMap> {
+    let mut names_to_urls = NameToUrlMap::new();
 
     // provide a URL example page -----------------------------------------------------------------
     // parse this x86 page, grab the contents of the table + the URLs they are referring to
-    let x86_online_docs = String::from("https://www.felixcloutier.com/x86/");
+    let x86_online_docs = "https://www.felixcloutier.com/x86/";
     debug!(
         "Fetching further documentation from the web -> {}...",
         x86_online_docs
     );
-    let body = reqwest::blocking::get(&x86_online_docs)?.text()?;
+    let body = reqwest::blocking::get(x86_online_docs)?.text()?;
 
     // skip first line
     let body_it = body.split("<td>").skip(1).step_by(2);
@@ -231,30 +234,48 @@ pub fn populate_instructions(xml_contents: &str) -> anyhow::Result<Vec<Instructi
     // <a href="./VSCATTERPF1DPS:VSCATTERPF1QPS:VSCATTERPF1DPD:VSCATTERPF1QPD.html">VSCATTERPF1QPS</a></td>
     //
     // let re = Regex::new(r"<a href=\"./(.*)">(.*)</a></td>")?;
-    let re = Regex::new(r#"<a href="\./(.*?\.html)">(.*?)</a>.*</td>"#)?;
+    let re = Regex::new(r#"^<a href="\./(.*?\.html)">(.*?)</a>.*</td>"#)?;
+    let link_prefix = "<a href=\"./";
     for line in body_it {
-        // take it step by step.. match a small portion of the line first...
-        let caps = re.captures(&line).unwrap();
+        // take it step by step.. match a small portion of the line first - cells that don't
+        // start with a link can be skipped without running the regex at all
+        let line = line.trim_start();
+        if !line.starts_with(link_prefix) {
+            continue;
+        }
+        let caps = match re.captures(&line) {
+            Some(caps) => caps,
+            None => continue,
+        };
         let url_suffix = caps.get(1).map_or("", |m| m.as_str());
         let instruction_name = caps.get(2).map_or("", |m| m.as_str());
 
-        // add URL to the corresponding instruction
-        match instructions_map.get_mut(instruction_name) {
-            None => (), // key not found
-            Some(instruction) => instruction.url = Some(x86_online_docs.clone() + url_suffix),
-        }
+        names_to_urls.insert(
+            String::from(instruction_name),
+            format!("{}{}", x86_online_docs, url_suffix),
+        );
     }
 
-    Ok(instructions_map
-        .into_iter()
-        .map(|(_, v)| v)
-        .collect::<Vec<_>>())
+    Ok(names_to_urls)
+}
+
+/// Add the URL of its online documentation to every instruction that has one
+pub fn populate_instruction_urls(instructions: &mut [Instruction], names_to_urls: &NameToUrlMap) {
+    for instruction in instructions {
+        if let Some(url) = names_to_urls.get(&instruction.name) {
+            instruction.url = Some(url.clone());
+        }
+    }
 }
 
 pub fn populate_name_to_instruction_map<'instruction>(
     instructions: &'instruction Vec<Instruction>,
     names_to_instructions: &mut NameToInstructionMap<'instruction>,
 ) {
+    // every instruction contributes at least its own name - reserve room for those up front
+    // instead of growing the map repeatedly
+    names_to_instructions.reserve(instructions.len());
+
     for instruction in instructions {
         for name in &instruction.get_associated_names() {
             names_to_instructions.insert(name, instruction);